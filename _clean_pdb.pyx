@@ -0,0 +1,104 @@
+# cython: boundscheck=False, wraparound=False, language_level=3
+"""
+_clean_pdb.pyx
+
+Optional C fast path for the clean_pdb record loop in proteinprep.py.
+Scans the whole input buffer with memchr/byte compares instead of Python
+bytecode per line; proteinprep.py falls back to the pure-Python mmap scan
+when this extension has not been built.
+
+Build in place (needs Cython and a C compiler):
+
+    cythonize -i _clean_pdb.pyx
+"""
+from libc.string cimport memchr
+
+
+def clean(const unsigned char[:] buf, bint remove_waters, bint remove_hetero,
+          chain_set, keep_lig):
+    """Filter PDB records in `buf`.
+
+    Mirrors the predicate semantics of proteinprep.clean_pdb: keeps
+    ATOM/HETATM/TER/END records, drops waters, heteroatoms (minus kept
+    ligands) and unkept chains. `chain_set`/`keep_lig` are the precomputed
+    bytes sets built by clean_pdb (or None / empty set).
+
+    Returns (output_bytes, waters, hetero_residues, skipped_chains, wrote_any).
+    """
+    cdef Py_ssize_t n = buf.shape[0]
+    cdef const unsigned char* p
+    cdef const unsigned char* nl
+    cdef Py_ssize_t pos = 0, end, ll
+    cdef Py_ssize_t waters = 0, hetero = 0, skipped = 0
+    cdef bint wrote_any = False, is_het, no_keep_lig = not keep_lig
+    cdef bint check_chain = chain_set is not None
+    cdef unsigned char r0, r1, r2, ch
+    cdef bytearray out = bytearray()
+    cdef bytes lb, chain_id, resname
+
+    if n == 0:
+        return b"", 0, 0, 0, False
+    p = &buf[0]
+
+    while pos < n:
+        nl = <const unsigned char*> memchr(p + pos, 0x0A, n - pos)
+        end = n if nl == NULL else nl - p
+        ll = end - pos
+        if ll and p[pos + ll - 1] == 0x0D:  # trailing \r
+            ll -= 1
+
+        # Record type: ATOM  / HETATM / TER / END, else drop the line.
+        is_het = (ll >= 6 and p[pos] == b'H' and p[pos+1] == b'E' and p[pos+2] == b'T'
+                  and p[pos+3] == b'A' and p[pos+4] == b'T' and p[pos+5] == b'M')
+        if not is_het:
+            if not ((ll >= 6 and p[pos] == b'A' and p[pos+1] == b'T' and p[pos+2] == b'O'
+                     and p[pos+3] == b'M' and p[pos+4] == b' ' and p[pos+5] == b' ')
+                    or (ll >= 3 and p[pos] == b'T' and p[pos+1] == b'E' and p[pos+2] == b'R')
+                    or (ll >= 3 and p[pos] == b'E' and p[pos+1] == b'N' and p[pos+2] == b'D')):
+                pos = end + 1
+                continue
+
+        if ll >= 27:
+            # Fixed-width record: test raw columns, no normalization.
+            if check_chain:
+                ch = p[pos + 21]
+                if ch != b' ' and bytes(buf[pos+21:pos+22]) not in chain_set:
+                    skipped += 1
+                    pos = end + 1
+                    continue
+            r0 = p[pos + 17]; r1 = p[pos + 18]; r2 = p[pos + 19]
+            if remove_waters and ((r0 == b'H' and r1 == b'O' and r2 == b'H')
+                                  or (r0 == b'H' and r1 == b'2' and r2 == b'O')
+                                  or (r0 == b'W' and r1 == b'A' and r2 == b'T')):
+                waters += 1
+                pos = end + 1
+                continue
+            if remove_hetero and is_het:
+                if no_keep_lig or bytes(buf[pos+17:pos+20]) not in keep_lig:
+                    hetero += 1
+                    pos = end + 1
+                    continue
+        else:
+            # Truncated/nonstandard record: tolerant strip-based checks.
+            lb = bytes(buf[pos:pos+ll])
+            chain_id = lb[21:22].strip() if ll >= 22 else b""
+            resname = lb[17:20].strip().upper() if ll >= 20 else b""
+            if check_chain and chain_id and chain_id.upper() not in chain_set:
+                skipped += 1
+                pos = end + 1
+                continue
+            if remove_waters and resname in (b"HOH", b"H2O", b"WAT"):
+                waters += 1
+                pos = end + 1
+                continue
+            if remove_hetero and is_het and resname not in keep_lig:
+                hetero += 1
+                pos = end + 1
+                continue
+
+        out += bytes(buf[pos:pos+ll])
+        out += b"\n"
+        wrote_any = True
+        pos = end + 1
+
+    return bytes(out), waters, hetero, skipped, wrote_any
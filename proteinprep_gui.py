@@ -13,16 +13,52 @@ Supports:
 
 import os
 import sys
+import selectors
 import subprocess
 import threading
 import PySimpleGUI as sg
 
 def run_cmd_in_thread(args, window):
-    """Run subprocess and stream output to GUI."""
+    """Run subprocess and stream output to GUI.
+
+    Drains stdout in 64 KB chunks rather than blocking on readline(), so
+    bursty multi-KB output (obabel) is forwarded as soon as it arrives
+    instead of stalling the stream. POSIX polls through a selector;
+    Windows select() only handles sockets, so there the worker thread just
+    does blocking chunked reads on the pipe.
+    """
     try:
-        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        for line in proc.stdout:
-            window.write_event_value("-OUT-", line.rstrip("\n"))
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+        pending = bytearray()
+
+        def emit(data):
+            nonlocal pending
+            pending += data
+            lines = pending.split(b"\n")
+            pending = bytearray(lines.pop())
+            for line in lines:
+                window.write_event_value("-OUT-", line.decode(errors="replace"))
+
+        if sys.platform == "win32":
+            while True:
+                data = os.read(proc.stdout.fileno(), 65536)
+                if not data:
+                    break
+                emit(data)
+        else:
+            sel = selectors.DefaultSelector()
+            sel.register(proc.stdout, selectors.EVENT_READ)
+            eof = False
+            while not eof:
+                for key, _ in sel.select(0.05):
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        eof = True
+                        break
+                    emit(data)
+            sel.close()
+        if pending:
+            window.write_event_value("-OUT-", pending.decode(errors="replace"))
         proc.wait()
         window.write_event_value("-DONE-", proc.returncode)
     except Exception as e: